@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
-import re, math
-from bs4 import BeautifulSoup
+import numpy as np
+import re, io, functools
+from dataclasses import dataclass
+from bs4 import BeautifulSoup, SoupStrainer
 
 st.set_page_config(page_title="Travian Artefact Planner", layout="wide")
 
@@ -23,19 +25,44 @@ if "PLANNED" not in st.session_state:
 if "UNPLANNED" not in st.session_state:
     st.session_state.UNPLANNED = pd.DataFrame()
 
-VALID_TYPES = {"small","large","unique"}
+# artefact / off tiers; an off can take artefacts up to its own tier (-1 = unknown type)
+TYPE_CODES = {"small":0, "large":1, "unique":2}
+# compact storage for numeric columns (map coords, speeds, levels are all small numbers);
+# nullable ints keep empty cells editable
+COL_DTYPES = {"coord_x":"Int16","coord_y":"Int16","Speed":"float32","TS":"Int8","Treasury":"Int8","UsesLeft":"Int8"}
 COORD_RE = re.compile(r"\(\s*([−-]?\d+)\s*\|\s*([−-]?\d+)\s*\)")
 
+MINUS_TABLE = str.maketrans({"\u2212": "-"})   # Travian renders negative coords with U+2212
+
 def nminus(s:str) -> str:
-    return s.replace("−","-") if isinstance(s,str) else s
+    return s.translate(MINUS_TABLE)
+
+def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    # numeric columns -> COL_DTYPES (non-numbers and out-of-range numbers become empty);
+    # already-typed and other columns untouched
+    fixed = {}
+    for c, dtype in COL_DTYPES.items():
+        if c in df.columns and df[c].dtype != dtype:
+            v = pd.to_numeric(df[c], errors="coerce")
+            if dtype.startswith("float"):
+                info = np.finfo(dtype)
+            else:
+                info = np.iinfo(dtype.lower())
+                v = v.round()
+            fixed[c] = v.where(v.between(info.min, info.max)).astype(dtype)
+    return df.assign(**fixed) if fixed else df
 
 # ==================================
 # Data editor w/ per-row delete UX
 # ==================================
-def editor_with_delete(df: pd.DataFrame, cols: list, key: str, title: str):
+@st.fragment   # edits/buttons in one table rerun only this editor, not the whole app
+def editor_with_delete(cols: list, key: str, title: str):
     st.markdown(f"### {title}")
-    # add a temporary delete checkbox column (never persisted outside this session render)
-    tmp = df.copy()
+    # always read the live table: fragment reruns would otherwise reuse the args of the last full run
+    df = st.session_state[key]
+    # add a temporary delete checkbox column (never persisted outside this session render);
+    # a shallow copy is enough since only the new column is written
+    tmp = df.copy(deep=False)
     tmp["_DELETE"] = False
     edited = st.data_editor(
         tmp, num_rows="dynamic", use_container_width=True,
@@ -53,55 +80,63 @@ def editor_with_delete(df: pd.DataFrame, cols: list, key: str, title: str):
     # normalize cols & types
     for c in cols:
         if c not in edited.columns: edited[c] = pd.NA
-    edited = edited[cols]
+    edited = coerce_types(edited[cols])
     st.session_state[key] = edited
     return edited
 
 # ==========================
 # Upload helpers (optional)
 # ==========================
+# spreadsheet header aliases per (lower-case) column, in order of preference
+EXCEL_ALIASES = {
+    "name": ["village","dorf","spieler","player"],
+    "coord_x": ["x","coord x","koordinate x"],
+    "coord_y": ["y","coord y","koordinate y"],
+    "speed": ["geschwindigkeit","tempo"],
+    "ts": ["tournament square","turnierplatz","tp"],
+    "type": ["typ","art","category"],
+    "treasury": ["treasury level","schatzkammer","kammer","level"],
+    "usesleft": ["uses","left","rest"]
+}
+# alias -> (column, rank); rank 0 = exact name, 1 = other case, 2+ = alias position
+ALIAS_RANK = {a: (col, 2+i) for col, al in EXCEL_ALIASES.items() for i, a in enumerate(al)}
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def read_excel_bytes(data: bytes) -> pd.DataFrame:
+    # keyed on the file content, so reruns with the same upload skip the Excel parse
+    return pd.read_excel(io.BytesIO(data), engine="calamine")
+
 def upload_excel(file, expected_cols, key_for_state):
+    # the uploader hands back the same file on every rerun: load it once, so later table edits stick
+    seen = f"_upload_id_{key_for_state}"
+    if st.session_state.get(seen) == file.file_id: return
     try:
-        df = pd.read_excel(file)
-        # map common aliases
-        lower_map = {c.lower(): c for c in df.columns}
-        aliases = {
-            "name": ["village","dorf","spieler","player"],
-            "coord_x": ["x","coord x","koordinate x"],
-            "coord_y": ["y","coord y","koordinate y"],
-            "speed": ["geschwindigkeit","tempo"],
-            "ts": ["tournament square","turnierplatz","tp"],
-            "type": ["typ","art","category"],
-            "treasury": ["treasury level","schatzkammer","kammer","level"],
-            "usesleft": ["uses","left","rest"]
-        }
-        out = pd.DataFrame()
-        for col in expected_cols:
-            if col in df.columns:
-                out[col] = df[col]
-                continue
-            if col.lower() in lower_map:
-                out[col] = df[lower_map[col.lower()]]
-                continue
-            matched = None
-            for a in aliases.get(col.lower(), []):
-                if a in lower_map:
-                    matched = lower_map[a]
-                    break
-            out[col] = df.get(matched, pd.NA)
+        df = read_excel_bytes(file.getvalue())
+        if set(expected_cols).issubset(df.columns):
+            out = df[expected_cols].copy()   # canonical headers, nothing to map
+        else:
+            # map common aliases: one pass over the sheet's columns, best-ranked source per expected column
+            wanted = {c.lower(): c for c in expected_cols}
+            source = {}
+            for src in df.columns:
+                lc = str(src).lower()
+                if lc in wanted: col, rank = wanted[lc], (0 if src == wanted[lc] else 1)
+                elif lc in ALIAS_RANK and ALIAS_RANK[lc][0] in wanted: col, rank = wanted[ALIAS_RANK[lc][0]], ALIAS_RANK[lc][1]
+                else: continue
+                if col not in source or rank < source[col][0]: source[col] = (rank, src)
+            out = pd.DataFrame({c: df[source[c][1]] if c in source else pd.NA for c in expected_cols}, index=df.index)
         # also support legacy "Coords" -> split
-        if "Coords" in df.columns and ("coord_x" in expected_cols or "coord_y" in expected_cols):
-            for i, val in df["Coords"].fillna("").items():
-                m = COORD_RE.search(nminus(str(val)))
-                if m:
-                    if "coord_x" in expected_cols:
-                        out.at[i,"coord_x"] = int(nminus(m.group(1)))
-                    if "coord_y" in expected_cols:
-                        out.at[i,"coord_y"] = int(nminus(m.group(2)))
+        if "Coords" in df.columns:
+            xy = df["Coords"].fillna("").astype(str).str.translate(MINUS_TABLE).str.extract(COORD_RE)
+            hit = xy[0].notna()
+            for col, g in (("coord_x", 0), ("coord_y", 1)):
+                if col in out.columns: out.loc[hit, col] = pd.to_numeric(xy.loc[hit, g])
         # defaults
+        out = coerce_types(out)
         if "UsesLeft" in out.columns:
-            out["UsesLeft"] = pd.to_numeric(out["UsesLeft"], errors="coerce").fillna(2).astype(int)
+            out["UsesLeft"] = out["UsesLeft"].fillna(2)
         st.session_state[key_for_state] = out[expected_cols]
+        st.session_state[seen] = file.file_id
         st.success(f"Loaded {len(out)} rows into {key_for_state}.")
     except Exception as e:
         st.error(f"Upload failed: {e}")
@@ -115,12 +150,13 @@ def classify_type(group_hint:str, name:str) -> str:
     if group_hint == "large": return "large"
     return "small"
 
+@st.cache_data(show_spinner=False, max_entries=16)
 def parse_artefacts_html(html: str, group_hint: str) -> pd.DataFrame:
     """
     Parse Travian artefact 'overview' HTML. These tables have headers like Name/Spieler/Allianz/Entfernung.
     Coordinates are usually NOT present there -> we leave coord_x/y empty (you can fill manually or attach later).
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml", parse_only=SoupStrainer("table"))  # only tables are read below
     rows = []
     for tbl in soup.find_all("table"):
         headers = " ".join(th.get_text(strip=True).lower() for th in tbl.find_all("th"))
@@ -132,27 +168,34 @@ def parse_artefacts_html(html: str, group_hint: str) -> pd.DataFrame:
                 if not name: continue
                 typ = classify_type(group_hint, name)
                 rows.append({"Artefact": name, "Type": typ, "coord_x": pd.NA, "coord_y": pd.NA})
-    return pd.DataFrame(rows)
+    return coerce_types(pd.DataFrame(rows))
 
+@st.cache_data(show_spinner=False, max_entries=16)
 def parse_coords_from_any_text(text: str) -> list[tuple[int,int]]:
-    coords = []
-    for m in COORD_RE.finditer(nminus(text)):
-        x = int(nminus(m.group(1))); y = int(nminus(m.group(2)))
-        coords.append((x,y))
-    return coords
+    # single regex scan; Python ints, so an oversized pasted number cannot overflow here
+    return [(int(x), int(y)) for x, y in COORD_RE.findall(nminus(text))]
 
 def attach_coords_in_order(targets_df: pd.DataFrame, coords: list[tuple[int,int]]) -> pd.DataFrame:
-    df = targets_df.copy()
-    j = 0
-    for i in df.index:
-        if (pd.isna(df.at[i,"coord_x"]) or pd.isna(df.at[i,"coord_y"])) and j < len(coords):
-            df.at[i,"coord_x"], df.at[i,"coord_y"] = coords[j]
-            j += 1
-    return df
+    # rows still lacking coords, in table order, take the coords one by one
+    rows = np.flatnonzero((targets_df["coord_x"].isna() | targets_df["coord_y"].isna()).to_numpy())[:len(coords)]
+    xy = np.array(coords[:len(rows)], dtype=float).reshape(-1, 2)
+    # write into float copies, then let coerce_types restore the compact dtype (off-map values become empty)
+    cx = targets_df["coord_x"].to_numpy(dtype=float, na_value=np.nan)
+    cy = targets_df["coord_y"].to_numpy(dtype=float, na_value=np.nan)
+    cx[rows], cy[rows] = xy[:,0], xy[:,1]
+    return coerce_types(targets_df.assign(coord_x=cx, coord_y=cy))
+
+def drop_duplicate_targets(df: pd.DataFrame) -> pd.DataFrame:
+    # a village holds one artefact, so a repeated (name, x, y) is the same target pasted twice;
+    # rows without coords are kept (several small artefacts share a name)
+    located = df["coord_x"].notna() & df["coord_y"].notna()
+    dup = located & df.duplicated(subset=["Artefact","coord_x","coord_y"], keep="first")
+    return df[~dup].reset_index(drop=True) if dup.any() else df
 
 # ==========================
 # Planner utilities
 # ==========================
+@functools.lru_cache(maxsize=256)   # few distinct spellings, called for every off on every plan
 def normalize_off_type(s):
     if not isinstance(s,str): return ""
     s = s.strip().lower().replace("ß","ss")
@@ -161,131 +204,176 @@ def normalize_off_type(s):
     if "small" in s or "klein" in s: return "small"
     return s
 
-def off_compat(off_type, arti_type):
-    off_type = normalize_off_type(off_type)
-    if off_type == "small":  return arti_type == "small"
-    if off_type == "large":  return arti_type in {"large","small"}
-    if off_type == "unique": return True
-    return False
-
-def pickup_compat(treasury, arti_type):
-    try: t = int(treasury)
-    except: return False
-    if t < 20: return arti_type == "small"
-    return True
-
-def priority_key(name, typ):
-    name = (name or "").lower()
-    typ  = (typ or "").lower()
-    if typ == "unique" or "unique" in name or "einzig" in name: return (1,0)
-    if any(k in name for k in ["trainer","ausbilder"]): return (2,0)
-    if any(k in name for k in ["diet","getreide","hunger"]): return (2,1)
-    if any(k in name for k in ["boots","stiefel","schnellere truppen"]): return (2,2)
-    if any(k in name for k in ["eyes","auge","späher","scout","spaeher"]): return (2,3)
-    if any(k in name for k in ["plan","bauplan","great warehouse","lager","granary","blueprint","weltwunder"]): return (3,0)
-    return (4,0)
-
-def ts_travel_hours(x1,y1,x2,y2,speed,ts_level):
-    # first 20 tiles at base speed, remainder with TS bonus (+10% per level)
-    try:
-        speed = float(speed); ts = float(ts_level) if ts_level not in (None,"") else 0.0
-    except: return float("inf")
-    d = math.hypot((x1-x2),(y1-y2))
-    if d <= 20: return d/speed
-    first = 20/speed
-    rest  = (d-20)/(speed*(1.0+0.1*ts))
-    return first+rest
+def encode_off_type(types: pd.Series) -> np.ndarray:
+    return types.map(normalize_off_type).map(TYPE_CODES).fillna(-1).to_numpy(dtype=np.int8)
+
+def off_compat(off_t, arti_t):
+    # int8 type codes, broadcastable: small off -> small, large -> small/large, unique -> any
+    return (arti_t >= 0) & (off_t >= arti_t)
+
+def pickup_compat(treasury, arti_t):
+    # Treasury < 20 can only hold small artefacts, >= 20 any
+    return (arti_t >= 0) & ((treasury >= 20) | (arti_t == TYPE_CODES["small"]))
+
+# (priority, name keywords) in match order; the first matching group wins, unmatched -> (4,0)
+PRIORITY_KEYWORDS = [
+    ((1,0), ["unique","einzig"]),
+    ((2,0), ["trainer","ausbilder"]),
+    ((2,1), ["diet","getreide","hunger"]),
+    ((2,2), ["boots","stiefel","schnellere truppen"]),
+    ((2,3), ["eyes","auge","späher","scout","spaeher"]),
+    ((3,0), ["plan","bauplan","great warehouse","lager","granary","blueprint","weltwunder"]),
+]
+
+def priority_rank(names: pd.Series, types: pd.Series) -> np.ndarray:
+    # vectorized priority per target: one str.contains scan per keyword group, encoded as p1*10+p2
+    names = names.fillna("").astype(str).str.lower()
+    conds = [names.str.contains("|".join(map(re.escape, kws)), regex=True).to_numpy() for _, kws in PRIORITY_KEYWORDS]
+    conds[0] = conds[0] | (types.fillna("").astype(str).str.lower() == "unique").to_numpy()
+    return np.select(conds, [p1*10+p2 for (p1,p2), _ in PRIORITY_KEYWORDS], default=40)
+
+def tile_distance(x1,y1,x2,y2):
+    # euclidean tile distance; works on scalars and (broadcast) coordinate arrays alike
+    return np.hypot(np.subtract(x1,x2), np.subtract(y1,y2))
+
+def ts_travel_hours_vec(d, speed, ts):
+    # first 20 tiles at base speed, remainder with TS bonus (+10% per level); branchless so it
+    # runs over whole arrays. Missing coords or a non-positive speed come out as inf
+    d, speed, ts = np.asarray(d, dtype=float), np.asarray(speed, dtype=float), np.asarray(ts, dtype=float)
+    speed = np.where(speed > 0, speed, np.nan)
+    eta = np.minimum(d,20)/speed + np.maximum(d-20,0)/(speed*(1.0+0.1*ts))
+    return np.where(np.isnan(eta), np.inf, eta)
+
+@dataclass
+class Pool:
+    # structure-of-arrays view of one resource table (offs / catas / pickups) for the planner
+    name: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    speed: np.ndarray
+    ts: np.ndarray
+
+def pool_from_df(df: pd.DataFrame) -> Pool:
+    # unusable coords/speed -> NaN (never picked), missing TS -> 0
+    num = lambda c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    return Pool(df["Name"].to_numpy(), num("coord_x"), num("coord_y"), num("Speed"), np.nan_to_num(num("TS")))
+
+def ts_travel_matrix(pool: Pool, tx, ty):
+    # ETA for every target (rows) x pool entry (cols) in one pass
+    return ts_travel_hours_vec(tile_distance(pool.x[None,:], pool.y[None,:], tx[:,None], ty[:,None]), pool.speed, pool.ts)
+
+def fastest(eta):
+    # position of the smallest finite ETA, or None
+    if eta.size == 0: return None
+    i = int(eta.argmin())
+    return i if np.isfinite(eta[i]) else None
 
 # ==========================
 # Planner (assignment)
 # ==========================
-def create_plan():
-    offs = st.session_state.OFFS.copy()
-    cats = st.session_state.CATTAS.copy()
-    pics = st.session_state.PICKUPS.copy()
-    tars = st.session_state.TARGETS.copy()
+def match_targets(active, off_eta, cat_eta, cat_uses, pick_eta):
+    """
+    Greedy matching on plain arrays, targets (rows) in priority order: fastest free OFF, fastest CATA
+    with uses left, fastest free PICKUP. inf in an ETA matrix marks an unusable pair.
+    Returns positional picks per target (-1 = none); a target is planned only if all three are >= 0.
+    """
+    n = len(active)
+    off_i, cat_i, pick_i = np.full(n, -1), np.full(n, -1), np.full(n, -1)
+    off_used  = np.zeros(off_eta.shape[1], dtype=bool)
+    pick_used = np.zeros(pick_eta.shape[1], dtype=bool)
+    cat_left  = cat_uses.copy()
+    for i in np.flatnonzero(active):
+        oi = fastest(np.where(off_used, np.inf, off_eta[i]))
+        if oi is None: continue
+        off_i[i] = oi
+        ci = fastest(np.where(cat_left > 0, cat_eta[i], np.inf))
+        if ci is None: continue
+        cat_i[i] = ci
+        pi = fastest(np.where(pick_used, np.inf, pick_eta[i]))
+        if pi is None: continue
+        pick_i[i] = pi
+        # reserve resources
+        off_used[oi] = True; pick_used[pi] = True; cat_left[ci] -= 1
+    return off_i, cat_i, pick_i
+
+@st.cache_data(show_spinner="Planning…", max_entries=16)
+def plan_tables(offs, cats, pics, tars):
+    # pure planner: (planned, unplanned) tables; cached on the content of the four inputs
+    offs, cats, pics, tars = offs.copy(), cats.copy(), pics.copy(), tars.copy()
 
-    # normalize types/defaults
-    offs["Type"] = offs["Type"].map(normalize_off_type).fillna("")
-    cats["UsesLeft"] = pd.to_numeric(cats.get("UsesLeft", 2), errors="coerce").fillna(2).astype(int)
-    pics["Treasury"] = pd.to_numeric(pics.get("Treasury", 0), errors="coerce").fillna(0).astype(int)
+    # defaults (columns are typed by coerce_types at the upload/editor boundary)
+    cat_uses = cats["UsesLeft"].fillna(2).to_numpy(dtype=int)
+    treasury = pics["Treasury"].fillna(0).to_numpy(dtype=int)
 
     # sort targets by priority
-    if not tars.empty:
-        p1, p2 = zip(*tars.apply(lambda r: priority_key(r["Artefact"], r["Type"]), axis=1))
-        tars["_p1"], tars["_p2"] = p1, p2
-        tars = tars.sort_values(by=["_p1","_p2"]).drop(columns=["_p1","_p2"])
-
-    planned, unplanned = [], []
-    used_off, used_pick = set(), set()
-
-    for _, t in tars.iterrows():
-        name = t.get("Artefact",""); typ = (t.get("Type","") or "").lower()
-        tx, ty = t.get("coord_x"), t.get("coord_y")
-
-        # basic validations
-        if typ not in VALID_TYPES:
-            unplanned.append({"Artefact": name, "Reason":"Invalid type"}); continue
-        if pd.isna(tx) or pd.isna(ty):
-            unplanned.append({"Artefact": name, "Reason":"Missing coordinates"}); continue
-        tx, ty = float(tx), float(ty)
-
-        # OFF match (usable once, type compat, fastest ETA)
-        best_off=None; best_off_eta=float("inf"); best_off_idx=None
-        for idx, o in offs.iterrows():
-            if idx in used_off: continue
-            if not off_compat(o.get("Type",""), typ): continue
-            if pd.isna(o.get("coord_x")) or pd.isna(o.get("coord_y")): continue
-            eta = ts_travel_hours(float(o["coord_x"]),float(o["coord_y"]),tx,ty,o.get("Speed",0),o.get("TS",0))
-            if eta < best_off_eta:
-                best_off_eta=eta; best_off=o; best_off_idx=idx
-        if best_off is None:
-            unplanned.append({"Artefact": name, "Reason":"No compatible OFF"}); continue
-
-        # CATA match (max 2 uses; fastest ETA)
-        best_cat=None; best_cat_eta=float("inf"); best_cat_idx=None
-        for idx, c in cats.iterrows():
-            if c.get("UsesLeft",0) <= 0: continue
-            if pd.isna(c.get("coord_x")) or pd.isna(c.get("coord_y")): continue
-            eta = ts_travel_hours(float(c["coord_x"]),float(c["coord_y"]),tx,ty,c.get("Speed",0),c.get("TS",0))
-            if eta < best_cat_eta:
-                best_cat_eta=eta; best_cat=c; best_cat_idx=idx
-        if best_cat is None:
-            unplanned.append({"Artefact": name, "Reason":"No CATA with uses left"}); continue
-
-        # PICKUP match (treasury compat; usable once; fastest ETA)
-        best_pick=None; best_pick_eta=float("inf"); best_pick_idx=None
-        for idx, p in pics.iterrows():
-            if idx in used_pick: continue
-            if not pickup_compat(p.get("Treasury",0), typ): continue
-            if pd.isna(p.get("coord_x")) or pd.isna(p.get("coord_y")): continue
-            eta = ts_travel_hours(float(p["coord_x"]),float(p["coord_y"]),tx,ty,p.get("Speed",0),p.get("TS",0))
-            if eta < best_pick_eta:
-                best_pick_eta=eta; best_pick=p; best_pick_idx=idx
-        if best_pick is None:
-            unplanned.append({"Artefact": name, "Reason":"No compatible PICKUP (treasury)"}); continue
+    tars = tars.iloc[np.argsort(priority_rank(tars["Artefact"], tars["Type"]), kind="stable")]
+
+    names = tars["Artefact"].to_numpy()
+    types = tars["Type"].fillna("").astype(str).str.lower().to_numpy()
+    tx = pd.to_numeric(tars["coord_x"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    ty = pd.to_numeric(tars["coord_y"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    tar_t = pd.Series(types).map(TYPE_CODES).fillna(-1).to_numpy(dtype=np.int8)
+
+    # basic validations
+    invalid = tar_t < 0
+    missing = np.isnan(tx) | np.isnan(ty)
+
+    # travel times for all targets x pool entries at once; incompatible pairs -> inf
+    off_pool, cat_pool, pick_pool = pool_from_df(offs), pool_from_df(cats), pool_from_df(pics)
+    off_eta  = ts_travel_matrix(off_pool, tx, ty)
+    cat_eta  = ts_travel_matrix(cat_pool, tx, ty)
+    pick_eta = ts_travel_matrix(pick_pool, tx, ty)
+    off_eta[~off_compat(encode_off_type(offs["Type"])[None,:], tar_t[:,None])] = np.inf
+    pick_eta[~pickup_compat(treasury[None,:], tar_t[:,None])] = np.inf
+
+    off_i, cat_i, pick_i = match_targets(~invalid & ~missing, off_eta, cat_eta, cat_uses, pick_eta)
+
+    # build both result tables once from the index arrays
+    rows = np.flatnonzero((off_i >= 0) & (cat_i >= 0) & (pick_i >= 0))
+    oi, ci, pi = off_i[rows], cat_i[rows], pick_i[rows]
+    off_t, cat_t, pick_t = off_eta[rows, oi], cat_eta[rows, ci], pick_eta[rows, pi]
+    planned = pd.DataFrame({
+        "Artefact": names[rows],
+        "Type": types[rows],
+        "Target (x|y)": "(" + pd.Series(tx[rows].astype(int)).astype(str) + "|" + pd.Series(ty[rows].astype(int)).astype(str) + ")",
+        "Off": off_pool.name[oi],
+        "Off ETA (h)": off_t.round(2),
+        "Cata": cat_pool.name[ci],
+        "Cata ETA (h)": cat_t.round(2),
+        "Pickup": pick_pool.name[pi],
+        "Pickup ETA (h)": pick_t.round(2),
+        "Arrival (h)": np.maximum.reduce([off_t, cat_t, pick_t]).round(2)
+    })
+    reason = np.select(
+        [invalid, missing, off_i < 0, cat_i < 0, pick_i < 0],
+        ["Invalid type", "Missing coordinates", "No compatible OFF", "No CATA with uses left", "No compatible PICKUP (treasury)"],
+        default="")
+    failed = reason != ""
+    unplanned = pd.DataFrame({"Artefact": names[failed], "Reason": reason[failed]})
+    return planned, unplanned
 
-        # reserve resources
-        used_off.add(best_off_idx)
-        used_pick.add(best_pick_idx)
-        cats.at[best_cat_idx,"UsesLeft"] = int(cats.at[best_cat_idx,"UsesLeft"]) - 1
-
-        arrival = max(best_off_eta, best_cat_eta, best_pick_eta)
-        planned.append({
-            "Artefact": name,
-            "Type": typ,
-            "Target (x|y)": f"({int(tx)}|{int(ty)})",
-            "Off": best_off.get("Name",""),
-            "Off ETA (h)": round(best_off_eta,2),
-            "Cata": best_cat.get("Name",""),
-            "Cata ETA (h)": round(best_cat_eta,2),
-            "Pickup": best_pick.get("Name",""),
-            "Pickup ETA (h)": round(best_pick_eta,2),
-            "Arrival (h)": round(arrival,2)
-        })
-
-    st.session_state.PLANNED = pd.DataFrame(planned)
-    st.session_state.UNPLANNED = pd.DataFrame(unplanned)
+def create_plan():
+    st.session_state.PLANNED, st.session_state.UNPLANNED = plan_tables(
+        st.session_state.OFFS, st.session_state.CATTAS, st.session_state.PICKUPS, st.session_state.TARGETS)
+
+# ==========================
+# Result display / export
+# ==========================
+@st.cache_data(show_spinner=False, max_entries=16)
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    # download payload; cached so reruns with an unchanged plan skip re-serializing.
+    # pandas writes the encoded bytes straight into the buffer (no intermediate str copy)
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
+
+PREVIEW_ROWS = 500
+
+def show_preview(df: pd.DataFrame):
+    # the browser only gets the first PREVIEW_ROWS rows; the CSV download has everything
+    st.dataframe(df.head(PREVIEW_ROWS), use_container_width=True, hide_index=True)
+    if len(df) > PREVIEW_ROWS:
+        st.caption(f"Showing first {PREVIEW_ROWS} of {len(df)} rows; download the CSV for the full table.")
 
 # ==========================
 # UI (Tabs)
@@ -301,23 +389,21 @@ with tab_offs:
     up = st.file_uploader("Upload Offs (Excel)", type=["xlsx","xls"], key="upl_offs")
     if up:
         upload_excel(up, ["Name","coord_x","coord_y","Speed","TS","Type"], "OFFS")
-    editor_with_delete(st.session_state.OFFS, ["Name","coord_x","coord_y","Speed","TS","Type"], "OFFS", "Offs")
+    editor_with_delete(["Name","coord_x","coord_y","Speed","TS","Type"], "OFFS", "Offs")
 
 with tab_cats:
     st.subheader("Catas (each row usable up to 2×)")
     up = st.file_uploader("Upload Catas (Excel)", type=["xlsx","xls"], key="upl_cats")
     if up:
-        upload_excel(up, ["Name","coord_x","coord_y","Speed","TS","UsesLeft"], "CATTAS")
-        if st.session_state.CATTAS["UsesLeft"].isna().all():
-            st.session_state.CATTAS["UsesLeft"] = 2
-    editor_with_delete(st.session_state.CATTAS, ["Name","coord_x","coord_y","Speed","TS","UsesLeft"], "CATTAS", "Catas")
+        upload_excel(up, ["Name","coord_x","coord_y","Speed","TS","UsesLeft"], "CATTAS")   # missing UsesLeft -> 2
+    editor_with_delete(["Name","coord_x","coord_y","Speed","TS","UsesLeft"], "CATTAS", "Catas")
 
 with tab_pics:
     st.subheader("Pickups / Treasuries (usable once; Treasury<20 = small only, ≥20 = any)")
     up = st.file_uploader("Upload Pickups (Excel)", type=["xlsx","xls"], key="upl_pics")
     if up:
         upload_excel(up, ["Name","coord_x","coord_y","Treasury","Speed","TS"], "PICKUPS")
-    editor_with_delete(st.session_state.PICKUPS, ["Name","coord_x","coord_y","Treasury","Speed","TS"], "PICKUPS", "Pickups")
+    editor_with_delete(["Name","coord_x","coord_y","Treasury","Speed","TS"], "PICKUPS", "Pickups")
 
 with tab_tars:
     st.subheader("Targets from Travian HTML")
@@ -335,7 +421,7 @@ with tab_tars:
                 if df.empty:
                     st.warning("No artefacts found in this HTML.")
                 else:
-                    st.session_state.TARGETS = pd.concat([st.session_state.TARGETS, df], ignore_index=True)
+                    st.session_state.TARGETS = drop_duplicate_targets(pd.concat([st.session_state.TARGETS, df], ignore_index=True))
                     st.success(f"Added {len(df)} targets. Fill in coordinates below or attach via right box.")
             else:
                 st.warning("Please paste artefact HTML.")
@@ -346,26 +432,31 @@ with tab_tars:
             if not coords:
                 st.warning("No coordinates found.")
             else:
-                st.session_state.TARGETS = attach_coords_in_order(st.session_state.TARGETS, coords)
+                st.session_state.TARGETS = drop_duplicate_targets(attach_coords_in_order(st.session_state.TARGETS, coords))
                 st.success("Coordinates attached (by order).")
-    editor_with_delete(st.session_state.TARGETS, ["Artefact","Type","coord_x","coord_y"], "TARGETS", "Targets")
+    editor_with_delete(["Artefact","Type","coord_x","coord_y"], "TARGETS", "Targets")
 
 with tab_plan:
     st.subheader("Create Plan")
     st.caption("Rules: OFF=1×, CATA=2×/row, PICKUP=1×; Type & Treasury compatibility; priority applied; TS travel time.")
-    if st.button("Create / Update Plan", type="primary"):
-        if st.session_state.OFFS.empty or st.session_state.CATTAS.empty or st.session_state.PICKUPS.empty or st.session_state.TARGETS.empty:
-            st.error("Please provide OFFS, CATTAS, PICKUPS and TARGETS first.")
+    if st.button("Create / Update Plan", type="primary", key="create_plan_btn"):
+        missing = [k for k in ("OFFS","CATTAS","PICKUPS","TARGETS") if len(st.session_state[k].index) == 0]
+        if missing:
+            st.error(f"Please provide {', '.join(missing)} first.")
         else:
             create_plan()
             st.success("Plan created.")
+    # rendering the result grids serializes them on every rerun; let the user switch that off
+    show_tables = st.checkbox("Show result tables", value=True, key="show_planned")
     if not st.session_state.PLANNED.empty:
         st.markdown("### ✅ Planned")
-        st.dataframe(st.session_state.PLANNED, use_container_width=True)
-        st.download_button("Download Planned (CSV)", st.session_state.PLANNED.to_csv(index=False).encode("utf-8"),
+        if show_tables:
+            show_preview(st.session_state.PLANNED)
+        st.download_button("Download Planned (CSV)", csv_bytes(st.session_state.PLANNED),
                            file_name="planned.csv", mime="text/csv")
     if not st.session_state.UNPLANNED.empty:
         st.markdown("### ❗ Unplanned")
-        st.dataframe(st.session_state.UNPLANNED, use_container_width=True)
-        st.download_button("Download Unplanned (CSV)", st.session_state.UNPLANNED.to_csv(index=False).encode("utf-8"),
+        if show_tables:
+            show_preview(st.session_state.UNPLANNED)
+        st.download_button("Download Unplanned (CSV)", csv_bytes(st.session_state.UNPLANNED),
                            file_name="unplanned.csv", mime="text/csv")
\ No newline at end of file